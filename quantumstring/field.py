@@ -17,14 +17,19 @@ class OneSpaceField:
     """
 
     val: ndarray
-    """ Matrix representing the field. The n-th line corresponds to the field at time step n. """
+    """ Matrix used as a ring buffer for the field. The field at time step n is stored in the line n modulo the capacity of the buffer (use `get_val_time` to read it). """
 
-    def __init__(self, init_val: ndarray, memory=np.inf):
+    INITIAL_CAPACITY = 64
+    """ Number of lines allocated at first when the memory is not limited. The buffer doubles its size each time it is full """
+
+    def __init__(self, init_val: ndarray, memory=np.inf, order="C", dtype=None):
         """
             Initialise the field
 
             :param init_val: initial value for the field. Each line is a value of the field at a certain time. First line is for t=0, second line is for t=Δt, etc
             :param memory: number of fields that will be saved at the same time (if inf -> no limit of memory)
+            :param order: memory layout of the buffer, for users reading the field themselves. "C" (default) if the field is mostly read at a given time (`get_val_time`), "F" if it is mostly read at a given position (`get_val_pos`, `time_fft`). The string simulation always uses "C": its kernels read the field line by line
+            :param dtype: type of the values of the field. If `None`, the type of `init_val` is kept
         """
         if memory < 3:
             raise ValueError("'memory' has to be greater than 3!")
@@ -34,48 +39,86 @@ class OneSpaceField:
             (x, y) = init_val.shape
             if x <= 0:
                 raise ValueError("Initial value for the field is not of a correct shape!")
-            self._last_tstep = x - 1
-            self.val = np.copy(init_val)
         except:
             raise ValueError("Initial value for the field is probably not a NumPy matrix!")
 
+        if order not in ("C", "F"):
+            raise ValueError("'order' has to be 'C' or 'F'!")
+
         self.memory = memory
+        self.order = order
+        self._capacity = max(OneSpaceField.INITIAL_CAPACITY, x) if memory == np.inf else int(memory)
+        self._last_tstep = x - 1
+        self.val = np.empty((self._capacity, y), dtype=init_val.dtype if dtype is None else dtype, order=order)
+        for t in range(max(0, x - self._capacity), x): # only the last lines are kept if memory is limited
+            self.val[t%self._capacity] = init_val[t]
     
     def pos_steps(self) -> int:
         """
             Returns the number of position steps in the field (aka the number of cells in the field, or the number of cols in the matrix)
         """
-        return self.val[0].shape[0]
+        return self.val.shape[1]
     
     def current_time_step(self) -> int:
         """
-            Returns the value of the last time step of the field (aka the number of rows minus one)
+            Returns the value of the last time step of the field
         """
         return self._last_tstep
     
     def update(self, newval: list):
         """
             Appends a new value of the field at the time t=t₁+Δt where t₁ is the current time step of the field
+            If the memory is limited, the new value overwrites the oldest one
+        """
+        self.next_val()[:] = newval
+    
+    def next_val(self) -> ndarray:
+        """
+            Moves the field to the time t=t₁+Δt and returns the line of the buffer where its value has to be written
+            If the memory is limited, this line holds the oldest value of the field, which is overwritten
         """
         self._last_tstep += 1
-        self.val = np.vstack((self.val, newval))
-        if self._last_tstep > self.memory: # if the amount of fields saved is superior to the memory allowed
-            self.val = np.delete(self.val, 0, 0)
+        if self._last_tstep >= self._capacity and self.memory == np.inf:
+            self._grow()
+        return self.val[self._last_tstep%self._capacity]
+    
+    def _grow(self):
+        """
+            Doubles the capacity of the buffer (only used when the memory is not limited, so the lines are never wrapped)
+        """
+        val = np.empty((2*self._capacity, self.val.shape[1]), dtype=self.val.dtype, order=self.order)
+        val[:self._capacity] = self.val
+        self.val = val
+        self._capacity *= 2
+    
+    def _first_tstep(self) -> int:
+        """
+            Returns the oldest time step still saved in the field
+        """
+        return max(0, self._last_tstep + 1 - self._capacity)
     
     def get_val_time(self, t: int) -> ndarray:
         """
-            Get the value of  the field at the step t×Δt
+            Get the value of  the field at the step t×Δt. If t is negative, counts backwards from the current time step (-1 is the last one)
+            The returned line is a view of the buffer: it will be overwritten when the memory is full
         """
-        tstep = t if (self._last_tstep < self.memory) or (t < 0) else t - self._last_tstep + self.memory
-        if tstep < 0 and t >= 0: # therefore user tried to access a field that does not exist anymore due to memory restriction
+        tstep = t if t >= 0 else self._last_tstep + 1 + t
+        if tstep > self._last_tstep:
+            raise IndexError("Cannot access the field at time step {}: current time step is {}".format(t, self._last_tstep))
+        if tstep < self._first_tstep(): # therefore user tried to access a field that does not exist anymore due to memory restriction
             raise ValueError("Cannot access the field to the cell at time step {} because of memory restriction".format(t))
-        return self.val[tstep]
+        return self.val[tstep%self._capacity]
     
     def get_val_pos(self, n: int) -> ndarray:
         """
-            Get the list of the values taken by the cell at step n×Δx for all time steps
+            Get the list of the values taken by the cell at step n×Δx for all time steps saved, in chronological order
+            If the buffer is in "F" order, the values are read from a contiguous column
         """
-        return self.val[:,n]
+        first = self._first_tstep()%self._capacity
+        last = self._last_tstep%self._capacity
+        if first <= last: # the saved time steps are not wrapped around the end of the buffer
+            return self.val[first:last + 1, n]
+        return np.concatenate((self.val[first:, n], self.val[:last + 1, n]))
 
     def get_last(self) -> ndarray:
         """
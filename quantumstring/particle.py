@@ -54,16 +54,12 @@ class Particle:
         self.space_steps = space_steps
         self.fixed = fixed
         self._firstpos = pos
-        pos_next = pos
 
         if not 0 <= pos < space_steps:
             raise ValueError("Cell position of particle {} is not on the string [0, {}]".format(pos, space_steps - 1))
 
         if not fixed:
             raise NotImplementedError("Moving particles not implemented yet! :(")
-        
-        init_val =np.vstack((pos, pos_next))
-        self.pos = OneSpaceField(init_val, memory=5)
 
         if type(color) == tuple:
             pass
@@ -91,15 +87,6 @@ class Particle:
             Particle.STR_COLOR: self.color,
             Particle.STR_INIT_POS: self._firstpos
         }
-    
-    def update(self):
-        """
-            Updates the particle
-        """
-        if self.fixed:
-            self.pos.update(self._firstpos)
-        else:
-            raise NotImplementedError()
 
 class Particles:
     """
@@ -114,6 +101,8 @@ class Particles:
     """ if True, at least one Particle is not fixed on the string """
     empty: bool
     """ if True, there is no Particle inside this object """
+    pos: OneSpaceField
+    """ Cells where the particles are: the n-th column corresponds to the n-th particle (the particles are updated only through this object) """
 
     def __init__(self, *particles: list[Particle], space_steps=0):
         """
@@ -139,6 +128,12 @@ class Particles:
         else:
             if space_steps == 0:
                 raise ValueError("No particles in the object: therefore 'space_steps' has to be entered manually!")
+
+        self._firstpos = np.array([p._firstpos for p in self.particles], dtype=np.int32)
+        self._masses = np.array([p.mass for p in self.particles], dtype=np.float64)
+        self._stiffnesses = np.array([p.stiffness for p in self.particles], dtype=np.float64)
+        self._fixed = np.array([p.fixed for p in self.particles], dtype=bool)
+        self.pos = OneSpaceField(np.vstack((self._firstpos, self._firstpos)), memory=3, dtype=np.int32)
     
     def infos(self) -> list:
         """
@@ -159,21 +154,18 @@ class Particles:
         """
             Updates all the particles
         """
-        if not self.empty:
-            for p in self.particles:
-                p.update()
+        if self.free_particles:
+            raise NotImplementedError()
+        self.pos.update(self._firstpos)
     
     def list_pos(self, tstep=-1) -> list[int]:
         """
-            Return a list where each entry corresponds to the index of the cell where a particle is, at the time step considered
+            Return an array where each entry corresponds to the index of the cell where a particle is, at the time step considered
+            The array is a view of the positions buffer: copy it to keep it after the next updates
 
             :param tstep: the time step considered
         """
-        s = []
-        if not self.empty:
-            for p in self.particles:
-                s.append(int(p.pos.get_val_time(tstep)))
-        return np.array(s)
+        return self.pos.get_val_time(tstep)
     
     def list_free(self, tstep=-1) -> list[int]:
         """
@@ -185,12 +177,9 @@ class Particles:
             :return: list containing the position of all free cells
             :rtype: list
         """
-        s = [i for i in range(0, self.space_steps)]
-        lp = self.list_pos(tstep=tstep)
-        if not self.empty:
-            for i in lp:
-                s = np.delete(s, i)
-        return np.array(s)
+        free = np.ones(self.space_steps, dtype=bool)
+        free[self.list_pos(tstep=tstep)] = False
+        return np.flatnonzero(free)
     
     def mass_density(self, tstep=-1, fixed=False) -> list[float]:
         """
@@ -199,12 +188,10 @@ class Particles:
             :param tstep: the time step considered
             :param fixed: if True, will return only the masses that are fixed on the string
         """
-        s = [0.0]*self.space_steps
-        if not self.empty:
-            for p in self.particles:
-                pos = int(p.pos.get_val_time(tstep)) # get the position of each particle
-                s[pos] += 0.0 if fixed and not p.fixed else p.mass # increment the vector where the particle is
-        return np.array(s)
+        s = np.zeros(self.space_steps)
+        masses = self._masses*self._fixed if fixed else self._masses
+        np.add.at(s, self.list_pos(tstep=tstep), masses) # increment the vector where each particle is
+        return s
 
     def spring_density(self, tstep=-1, fixed=False) -> list[float]:
         """
@@ -213,12 +200,10 @@ class Particles:
             :param tstep: the time step considered
             :param fixed: if True, will return only the masses that are fixed on the string
         """
-        s = [0.0]*self.space_steps
-        if not self.empty:
-            for p in self.particles:
-                pos = int(p.pos.get_val_time(tstep)) # get the position of each particle
-                s[pos] += 0.0 if fixed and not p.fixed else p.stiffness # increment the vector where the particle is
-        return np.array(s)
+        s = np.zeros(self.space_steps)
+        stiffnesses = self._stiffnesses*self._fixed if fixed else self._stiffnesses
+        np.add.at(s, self.list_pos(tstep=tstep), stiffnesses) # increment the vector where each particle is
+        return s
 
     def mass_presence(self, tstep=-1, fixed=False) -> list[bool]:
         """
@@ -227,8 +212,6 @@ class Particles:
             :param tstep: the time step considered
             :param fixed: if True, will return only the masses that are fixed on the string
         """
-        s = np.array([False]*self.space_steps)
         md = self.mass_density(tstep=tstep, fixed=fixed)
-        s[md != 0] = True
-        return np.array(s)
+        return md != 0
 
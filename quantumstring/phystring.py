@@ -1,20 +1,71 @@
 from __future__ import annotations
 
 import numpy as np
+from numpy import ndarray
 
 from quantumstring.field import OneSpaceField 
 from quantumstring.edge import Edge, LoopEdge, AbsorberEdge, ExcitatorSinAbsorber
 from quantumstring.particle import Particles
 
+try:
+    from numba import njit, prange, get_num_threads
+except ImportError: # numba is optional: the NumPy implementation of the kernel is used instead
+    njit = None
+    prange = range
+
 """
     Class for dealing with the actual string
 """
 
+def _field_step_numpy(u: ndarray, utm: ndarray, a: ndarray, b: ndarray, utp: ndarray):
+    """
+        Writes in `utp` the field at t+Δt, without the edges conditions (the string is considered as a loop)
+
+        :param u: field at current time
+        :param utm: field at previous time
+        :param a: factor (2β-γ)/(1+β) of the field (see equation)
+        :param b: factor 1/(1+β) of the neighbouring cells (see equation)
+        :param utp: array where to write the field at next time
+    """
+    utp[:] = b*(np.roll(u, -1) + np.roll(u, 1)) + a*u - utm
+
+def _field_step_loop(u: ndarray, utm: ndarray, a: ndarray, b: ndarray, utp: ndarray):
+    """
+        Same as `_field_step_numpy`, cell by cell. Meant to be compiled with numba
+    """
+    n = u.shape[0]
+    for i in range(n):
+        uxp = u[i + 1] if i < n - 1 else u[0] # field at x + Δx
+        uxm = u[i - 1] # field at x - Δx
+        utp[i] = b[i]*(uxp + uxm) + a[i]*u[i] - utm[i]
+
+def _field_step_loop_parallel(u: ndarray, utm: ndarray, a: ndarray, b: ndarray, utp: ndarray):
+    """
+        Same as `_field_step_loop`, the cells being independent the loop is split between threads. Meant to be compiled with numba and `parallel=True`
+    """
+    n = u.shape[0]
+    for i in prange(n):
+        uxp = u[i + 1] if i < n - 1 else u[0] # field at x + Δx
+        uxm = u[i - 1] # field at x - Δx
+        utp[i] = b[i]*(uxp + uxm) + a[i]*u[i] - utm[i]
+
+_FIELD_STEP_SIGNATURES = [
+    "void(float64[::1], float64[::1], float64[::1], float64[::1], float64[::1])",
+    "void(float32[::1], float32[::1], float32[::1], float32[::1], float32[::1])"
+] # explicit signatures: the serial kernel is compiled (or loaded from the disk cache) when the module is imported, not at the first time step
+# the parallel kernel is only used on big strings with several threads: it is compiled the first time it is called
+# the disk cache of numba is indexed by the function, not by the compile options: each variant needs its own function to get its own cache entries
+_field_step_jit = njit(_FIELD_STEP_SIGNATURES, cache=True, fastmath=True)(_field_step_loop) if njit is not None else None
+_field_step_jit_parallel = njit(cache=True, fastmath=True, parallel=True)(_field_step_loop_parallel) if njit is not None else None
+
 class PhyString:
     """
         Class for the simulation of the string
     """
-    def __init__(self, length: float, space_steps: int, dt: float, linear_density: float, tension: float, edge_left: Edge, edge_right: Edge, ic0: list[float], ic1: list[float], particles: Particles, memory_field=5):
+    PARALLEL_MIN_STEPS = 16384
+    """ Minimal number of cells for the compiled kernel to run on several threads (on small strings, the threads cost more than they save) """
+
+    def __init__(self, length: float, space_steps: int, dt: float, linear_density: float, tension: float, edge_left: Edge, edge_right: Edge, ic0: list[float], ic1: list[float], particles: Particles, memory_field=3, jit=True, dtype=np.float64):
         """
             Initialisation of the string
 
@@ -28,7 +79,9 @@ class PhyString:
             :param ic_pos: initial condition of the position of the string
             :param ic_vel: initial condition of the velocity of the string
             :param particles: Particles object 
-            :param memory_field: the maximum simultaneous elements the field class can hold. 'np.inf' for no limitation
+            :param memory_field: the maximum simultaneous elements the field class can hold (at least 3: the two last fields and the one being computed). 'np.inf' for no limitation
+            :param jit: if `True` and `numba` is installed, the evolution of the field is computed with a compiled kernel. Use `False` to debug with the NumPy implementation
+            :param dtype: type of the values of the field (`np.float64` or `np.float32`)
         """
         self.dx = length/float(space_steps)
         self.invdx2 = 1/self.dx**2
@@ -50,9 +103,18 @@ class PhyString:
             raise ValueError("Initial conditions shapes for initial positions not matching! ")
 
         init_val = np.vstack((ic0, ic1))
-        self.field = OneSpaceField(init_val, memory=memory_field)
+        self.dtype = dtype
+        self.field = OneSpaceField(init_val, memory=memory_field, dtype=dtype)
+
+        self.energy = OneSpaceField(init_val*0.0, memory=3, dtype=dtype)
+
+        self.jit = jit and _field_step_jit is not None
+        self._field_step = _field_step_numpy
+        if self.jit:
+            parallel = space_steps >= PhyString.PARALLEL_MIN_STEPS and get_num_threads() > 1
+            self._field_step = _field_step_jit_parallel if parallel else _field_step_jit
 
-        self.energy = OneSpaceField(init_val*0.0, memory=5)
+        self.update_coefficients()
 
     def __repr__(self):
         return "[STRING]    L={0:.1f}m, T={1:.1f}N, ρ={2:.1f}g/m, c={3:.1f}m/s ; {4}|~~~~|{5} ; {6} particles".format(
@@ -65,18 +127,27 @@ class PhyString:
             self.particles.particles_quantity
         )
         
-    def update(self):
+    def update_coefficients(self):
         """
-            Updates the string for the next time step
+            Computes the coefficients of the equations that depend on the particles
+            Since they only change when the particles move, this is done once for fixed particles
         """
-
-        ### IF THE PARTICLES ARE ALL FIXED, NO NEED TO RECOMPUTE THIS EVERY FRAME !!!
         m = self.particles.mass_density()
         k = self.particles.spring_density()
-        rho = self.linear_density + m
         beta = m/(self.linear_density*self.dx)
         gamma = k*self.dx/self.tension
-        ###
+        self._rho = self.linear_density + m
+        self._kappa = k
+        b = 1.0/(1.0 + beta)
+        self._b = b.astype(self.dtype) # same type as the field, so that the compiled kernel is specialised for it
+        self._a = ((2.0*beta - gamma)*b).astype(self.dtype)
+
+    def update(self):
+        """
+            Updates the string for the next time step
+        """
+        if self.particles.free_particles:
+            self.update_coefficients()
 
         tstep = self.field.current_time_step()
         last_val = self.field.get_last() # field at t
@@ -84,27 +155,26 @@ class PhyString:
         last_val_m = PhyString.shift_list_right(last_val) # field at t right shifted. means that at x position, will return value at x - 1
         last_val_p = PhyString.shift_list_left(last_val) # field at t left shifted. means that at x position, will return value at x + 1
 
-        newval = self.field_evo(last_val, llast_val, last_val_p, last_val_m, beta, gamma, tstep) # evolution of the string according to the equations
+        energy = self.linear_energy(last_val, llast_val, last_val_p, last_val_m, self._rho, self._kappa)
 
-        energy = self.linear_energy(last_val, llast_val, last_val_p, last_val_m, rho, k)
+        newval = self.field.next_val() # update field: the new field is written directly in its buffer (with a memory of 3, in the line of the field at t - 2)
+        self.field_evo(last_val, llast_val, self._a, self._b, tstep, newval) # evolution of the string according to the equations
 
-        self.field.update(newval) # update field
         self.particles.update() # update particles
         self.energy.update(energy)
             
-    def field_evo(self, u: list[float], utm: list[float], uxp: list[float], uxm: list[float], beta: list[float], gamma: list[float], tstep: int) -> list[float]:
+    def field_evo(self, u: list[float], utm: list[float], a: list[float], b: list[float], tstep: int, utp: list[float]) -> list[float]:
         """
-            Given the field, returns the evolution in time
+            Given the field, computes the evolution in time in `utp` and returns it
 
             :param u: field at current time
             :param utm: field at previous time
-            :param uxp: field at current time shifted -Δx
-            :param uxm: field at current time shifted +Δx
-            :param beta: (see equation)
-            :param gamma: (see equation)
+            :param a: factor (2β-γ)/(1+β) of the field (see equation)
+            :param b: factor 1/(1+β) of the neighbouring cells (see equation)
+            :param tstep: current time step
+            :param utp: array where to write the field at next time (must not be `u`, whose neighbouring cells are read)
         """
-        dbg = 2.0*beta - gamma # compute the factor 2β-γ
-        utp = (uxp+ uxm + u*dbg)/(1.0 + beta) - utm # the value of the field at t+Δt
+        self._field_step(u, utm, a, b, utp) # the value of the field at t+Δt
 
         # check if excitator is absorber bc equations modified at the ends
         if self.edge_left.absorber:
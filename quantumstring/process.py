@@ -24,6 +24,7 @@ class PostProcess:
     ANIM_PREFIX = "QuantumStringANIMATION"
     FOURIER_PREFIX = "FourierTransform"
     SPECTRO_PREFIX = "FourierSpectro"
+    ANIM_FRAMES = 600 # number of frames of an animation when `frameskip` is not given
 
     COLOR_BLACK = (0, 0, 0)
     COLOR_GRAY = (192, 192, 192)
@@ -175,19 +176,17 @@ class PostProcess:
         return np.array(r)
     
     def _get_cells(self, *cells: int) -> np.ndarray:
+        """
+            Returns a 2D array r[t,n] where r is the value of the field, t the timestep considered, and n the index of the cell in `cells`
+        """
         self.fieldfile.seek(0, 0)
+        cells = np.array(cells, dtype=int)
         r = []
         t = -1
         for field in self.fieldfile:
             if t >= 0:
                 field = Simulation.str2list(field, type=float)
-                line = []
-                for c in cells:
-                    try:
-                        line.append(field[c])
-                    except: # probably end of file
-                        pass
-                r.append(line) if len(line) != 0 else None
+                r.append(field[cells]) if field.size != 0 else None # empty line: probably end of file
             t += 1
         return np.array(r)
     
@@ -224,11 +223,7 @@ class PostProcess:
             if t >= 0:
                 field = Simulation.str2list(field, type=float)
                 particles = Simulation.str2list(particles, type=int)
-                pos_part = []
-                for pos in particles:
-                    pos_part.append(field[pos])
-                pos_part = np.array(pos_part)
-                r.append(pos_part)
+                r.append(field[particles])
             t += 1
         return np.array(r)
     
@@ -242,24 +237,31 @@ class PostProcess:
             :param anim_params: dictionary containing the parameters of the animation
             :param timestep: time step corresponding to the state
             :param yscale: scaling factor for vertical axis
+
+            The image is drawn in the buffer `anim_params["frame"]` if given (it is then overwritten at the next call), else in a copy of `baseimg`
         """
-        img = np.copy(baseimg)
-        x = np.linspace(anim_params["ox"], anim_params["endstring"], f.size).astype(np.int32)
-        y = (-anim_params["ppx_per_m"]*yscale*f + anim_params["oy"]).astype(np.int32)
-        string = np.array([(x[i], y[i]) for i in range(1, f.size - 1)])
-        string = string.reshape((-1, 1, 2))
+        img = anim_params.get("frame")
+        if img is None:
+            img = np.copy(baseimg)
+        else:
+            np.copyto(img, baseimg) # clears the previous frame
+        x = anim_params["x"]
+        y = (np.float32(-anim_params["ppx_per_m"]*yscale)*f + np.float32(anim_params["oy"])).astype(np.int32) # single precision is enough for pixels
+        string = anim_params["points"]
+        string[:, 0, 1] = y[1:-1] # the horizontal coordinates never change, only the vertical ones are written
 
         cv2.polylines(img, [string], False, PostProcess.COLOR_WHITE)
         font = cv2.FONT_HERSHEY_SIMPLEX
         cv2.putText(img, "t={:.6f}s".format(self.dt*timestep), (2, anim_params["ly"] - 5), font, 0.5, PostProcess.COLOR_GRAY, 1, cv2.LINE_AA) 
 
-        r = int(anim_params["mass_rad"])
-        for pidx, part in zip(p, self.particles):
-            center = (int(x[pidx]), int(y[pidx]))
-            try:
-                cv2.circle(img, center, r, part[Particle.STR_COLOR], -1)
-            except IndexError:
-                pass
+        colors = anim_params["particles_colors"]
+        n = min(len(p), len(colors))
+        p = np.asarray(p[:n], dtype=np.intp) # cells as indices, even when there is no particle (empty float array)
+        dy, dx = anim_params["disk"]
+        ys = y[p, None] + dy # all the pixels of all the particles, stamped at once
+        xs = x[p, None] + dx
+        inside = (ys >= 0) & (ys < img.shape[0]) & (xs >= 0) & (xs < img.shape[1])
+        img[ys[inside], xs[inside]] = np.broadcast_to(colors[:n, None], ys.shape + (3,))[inside]
 
         try:
             img[y[0], x[0]] = PostProcess.COLOR_GRAY
@@ -269,21 +271,24 @@ class PostProcess:
         
         return img
 
-    def anim(self, path: str, title=False, resolution=(720, 480), fps=60, frameskip=1, yscale=1.0, compress=True):
+    def anim(self, path: str, title=False, resolution=(720, 480), fps=60, frameskip=None, yscale=1.0, compress=True):
         """
             Creates a animation of the simulation, using `opencv`
 
             :param path: path where to write the video
             :param title: a title for the video. if `False`, automatic name
             :param fps: frame per seconds for the generated video
-            :param frameskip: will compute 1 out of `frameskip` frames for the generated video
+            :param frameskip: will compute 1 out of `frameskip` frames for the generated video. If `None`, chosen so that the video has about `PostProcess.ANIM_FRAMES` frames
             :param yscale: vertical scaling for field
-            :param compress: if `True`, will try to compress the video using `ffmeg`
+            :param compress: if `True`, will try to compress the video using `ffmeg` (frames are streamed to it). If it fails, an uncompressed video is made with `opencv`
         """
         ts = int(datetime.datetime.now().timestamp())
         self.fieldfile.seek(0, 0)
         self.particlesfile.seek(0, 0)
 
+        if frameskip is None: # the time step is very small compared to the motion, most of the frames would look the same
+            frameskip = max(1, self.nt//PostProcess.ANIM_FRAMES)
+
         title = PostProcess.ANIM_PREFIX if type(title) == bool and not title else title
         videopath = os.path.join(path, "{}-{}-UNCOMPRESSED.mp4".format(title, ts))
         videopath_compressed = os.path.join(path, "{}-{}.mp4".format(title, ts))
@@ -300,6 +305,13 @@ class PostProcess:
             ppx_per_m=length_ppx,
             mass_rad=3
         )
+        anim_params["x"] = np.linspace(anim_params["ox"], anim_params["endstring"], self.nx).astype(np.int32)
+        anim_params["points"] = np.empty((self.nx - 2, 1, 2), dtype=np.int32) # points of the string (without the edges) for cv2.polylines
+        anim_params["points"][:, 0, 0] = anim_params["x"][1:-1]
+        r = anim_params["mass_rad"]
+        disk = cv2.circle(np.zeros((2*r + 1, 2*r + 1), np.uint8), (r, r), r, 1, -1) # pixels drawn by opencv for a particle...
+        anim_params["disk"] = np.nonzero(disk) - np.array([[r], [r]]) # ...as offsets from its center
+        anim_params["particles_colors"] = np.array([part[Particle.STR_COLOR] for part in self.particles], dtype=np.uint8).reshape((-1, 3))
 
         baseimg = np.zeros((resolution[1], resolution[0], 3), np.uint8)
 
@@ -327,34 +339,52 @@ class PostProcess:
             if count > 4:
                 break
         baseimg = np.array(img_pil)
+        anim_params["frame"] = np.empty_like(baseimg) # a single buffer is drawn for all the frames
 
-        video = cv2.VideoWriter(videopath, cv2.VideoWriter_fourcc(*'mp4v'), fps, (lx, ly))
+        encoder = None
+        if compress: # the frames are piped to ffmpeg as they are drawn, no uncompressed video is written on the disk
+            try:
+                encoder = ffmpeg.input("pipe:", format="rawvideo", pix_fmt="bgr24", s="{}x{}".format(lx, ly), framerate=fps)
+                encoder = ffmpeg.output(encoder, videopath_compressed, vcodec="h264", pix_fmt="yuv420p")
+                encoder = ffmpeg.run_async(encoder, pipe_stdin=True, overwrite_output=True)
+            except:
+                encoder = None
+                print("WARNING: could not start 'ffmpeg', the video will not be compressed...") if self.log else None
+        video = cv2.VideoWriter(videopath, cv2.VideoWriter_fourcc(*'mp4v'), fps, (lx, ly)) if encoder is None else None
 
         print("Animation for {} simulation:".format(self.date)) if self.log else None
         t = -1
-        for field, particles in zip(self.fieldfile, self.particlesfile):
-            if t >= 0: # the file has a one-line header (json format)
-                print("{}/{} images processed".format(int(t/frameskip), int(self.nt/frameskip)), end="\r") if self.log else None
-                field = Simulation.str2list(field, type=float)
-                particles = Simulation.str2list(particles, type=int)
-                if t%frameskip == 0:
-                    img = self._img_field(baseimg, field, particles, anim_params, t, yscale=yscale)
-                    video.write(img)
-            t += 1
-        
-        video.release()
-        cv2.destroyAllWindows()
+        try:
+            for field, particles in zip(self.fieldfile, self.particlesfile):
+                if t >= 0: # the file has a one-line header (json format)
+                    if t%frameskip == 0: # the lines are only parsed for the frames drawn, and drawn right after
+                        print("{}/{} images processed".format(int(t/frameskip), int(self.nt/frameskip)), end="\r") if self.log else None
+                        field = Simulation.str2list(field, type=np.float32)
+                        particles = Simulation.str2list(particles, type=int)
+                        img = self._img_field(baseimg, field, particles, anim_params, t, yscale=yscale)
+                        if encoder is None:
+                            video.write(img)
+                        else:
+                            encoder.stdin.write(img.tobytes())
+                t += 1
+        except BrokenPipeError: # ffmpeg stopped before the end: the return code is checked below
+            pass
 
-        return_path = videopath
-        if compress:
+        if encoder is None:
+            video.release()
+            cv2.destroyAllWindows()
+            return_path = videopath
+        else:
             try:
-                video = ffmpeg.input(videopath)
-                video = ffmpeg.output(video, videopath_compressed, vcodec="h264")
-                ffmpeg.run(video)
-                os.remove(videopath)
-                return_path = videopath_compressed
-            except:
+                encoder.stdin.close()
+            except BrokenPipeError:
+                pass
+            if encoder.wait() != 0:
                 print("WARNING: could not compress the video due to 'ffmpeg' error...") if self.log else None
+                if os.path.exists(videopath_compressed): # ffmpeg may have created the file before failing
+                    os.remove(videopath_compressed)
+                return self.anim(path, title=title, resolution=resolution, fps=fps, frameskip=frameskip, yscale=yscale, compress=False)
+            return_path = videopath_compressed
 
         print("video created successfully!") if self.log else None
         return return_path
@@ -532,11 +562,11 @@ class PostProcess:
             transforms[key] = {}
             a, b = int(w[0]*self.nx), int(w[1]*self.nx)
             transforms[key]["window_cells"] = (a, b)
-            transforms[key]["mat"] = np.array([[0.0]*(b - a)])
+            transforms[key]["mat"] = [] # list of the FFTs: appending to a list is amortised O(1), unlike np.append which copies the whole matrix
             filename = "{}_{}{}.txt".format(ts, PostProcess.FOURIER_PREFIX, key)
             filepath = os.path.join(path, filename)
             r.append(filepath)
-            file = open(filepath, "w")
+            file = open(filepath, "w", buffering=Simulation.FILE_BUFFER)
             transforms[key]["file"] = file
             copyinfos = self.infos.copy()
             copyinfos["fourier"] = dict(window_cells=(a, b))
@@ -556,24 +586,24 @@ class PostProcess:
                     towrite = ""
                     if t%frameskip == 0:
                         a, b = tm["window_cells"]
-                        mat = tm["mat"]
                         fft, tm["f"] = osf.space_fft(-1, self.infos["dx"], xwindow=(a, b))
-                        tm["mat"] = np.append(mat, [fft], axis=0)
+                        tm["mat"].append(fft)
                         towrite = Simulation.list2str(fft)
                     tm["file"].write("{}\n".format(towrite))
-                    frames = tm["mat"].shape[0] - 1
+                    frames = len(tm["mat"])
             t += 1
 
         time = np.linspace(0.0, self.duration, frames)
+
+        for tm in transforms.values():
+            tm["file"].close()
         
         if spectrograph:
             print("creating spectrograph...") if self.log else None
             for key, tm in transforms.items(): # creating the spectrography
-                tm["file"].close()
                 f = tm["f"]
-                mat = tm["mat"]
+                mat = np.array(tm["mat"])
                 ff, tt = np.meshgrid(f, time)
-                mat = np.delete(mat, 0, 0)
                 plt.pcolormesh(tt, ff, np.abs(mat), shading="gouraud")
                 plt.title(key)
                 plt.xlabel("Time [s]")
@@ -26,6 +26,7 @@ class Simulation:
     VID_PREFIX = "QuantumString"
     IMG_FORMAT = "png"
     PERCENT_MAX = 256
+    FILE_BUFFER = 1 << 20 # size of the write buffer of the files [bytes]: a line per time step is written, so the buffer gathers many of them per system call
 
     STR_DT = "dt"
     STR_DX = "dx"
@@ -44,7 +45,7 @@ class Simulation:
     GRAY = (64, 64, 64)
     WHITE = (255, 255, 255)
 
-    def __init__(self, dt: float, time_steps: int, space_steps: int, string_len: float, string_density: float, string_tension: float, edge_left: Edge, edge_right: Edge, ic0: list[float], ic1: list[float], particles, memory_field=5, log=True):
+    def __init__(self, dt: float, time_steps: int, space_steps: int, string_len: float, string_density: float, string_tension: float, edge_left: Edge, edge_right: Edge, ic0: list[float], ic1: list[float], particles, memory_field=3, log=True, jit=True, dtype=np.float64):
         """
             Initialisation of the simulation
 
@@ -59,15 +60,17 @@ class Simulation:
             :param ic_pos: initial condition of the position of the string
             :param ic_vel: initial condition of the velocity of the string
             :param particles: Particles object
-            :param memory_field:
+            :param memory_field: number of fields kept in memory by the string. 3 is enough for the evolution, the other fields are written in the files ('np.inf' to keep them all)
             :param log: if True, prints the simulation loading
+            :param jit: if True, uses the numba compiled kernel for the string evolution (when numba is installed)
+            :param dtype: type of the values of the field computed (`np.float32` halves the memory used and doubles the SIMD width, at the cost of precision)
         """
         self.log = log
         self.time_steps = time_steps
         self.dt = dt
         self.time = str(datetime.datetime.now())
 
-        self.s = PhyString(string_len, space_steps, dt, string_density, string_tension, edge_left, edge_right, ic0, ic1, particles, memory_field=memory_field)
+        self.s = PhyString(string_len, space_steps, dt, string_density, string_tension, edge_left, edge_right, ic0, ic1, particles, memory_field=memory_field, jit=jit, dtype=dtype)
     
     def infos(self) -> dict[str]:
         """
@@ -118,9 +121,9 @@ class Simulation:
         begtxt = "{}\n".format(jsoninfos)
 
         if file:
-            ff = open(field_file_path, "w", encoding="utf-8")
-            pf = open(particles_file_path, "w", encoding="utf-8")
-            ef = open(energy_field_path, "w", encoding="utf-8")
+            ff = open(field_file_path, "w", encoding="utf-8", buffering=Simulation.FILE_BUFFER)
+            pf = open(particles_file_path, "w", encoding="utf-8", buffering=Simulation.FILE_BUFFER)
+            ef = open(energy_field_path, "w", encoding="utf-8", buffering=Simulation.FILE_BUFFER)
 
             ff.write(begtxt)
             pf.write(begtxt)
@@ -148,19 +151,11 @@ class Simulation:
             percent = newpercent
             # ...
             
-            # writing the fields in the files
-            f = self.s.field.get_val_time(t)
-            pp = self.s.particles.list_pos(tstep=t)
-            e = self.s.energy.get_val_time(t)
-            
+            # writing the fields in the files, each line being formatted as soon as it is read from the buffers
             if file:
-                fstr = Simulation.list2str(f)
-                pstr = Simulation.list2str(pp)
-                estr = Simulation.list2str(e)
-
-                ff.write("{}\n".format(fstr))
-                pf.write("{}\n".format(pstr))
-                ef.write("{}\n".format(estr))
+                ff.write(Simulation.list2str(self.s.field.get_val_time(t)) + "\n")
+                pf.write(Simulation.list2str(self.s.particles.list_pos(tstep=t)) + "\n")
+                ef.write(Simulation.list2str(self.s.energy.get_val_time(t)) + "\n")
         print("")
 
         if file:
@@ -187,7 +182,10 @@ class Simulation:
             '1,2,3'
             ```
         """
-        return str(list(l)).replace("[", "").replace("]", "").replace(" ", "").replace("\n", "")
+        l = np.asarray(l)
+        if l.dtype == np.float32: # Python floats would print the float32 values with the digits of a float64
+            return ",".join(map(str, l))
+        return ",".join(map(str, l.tolist())) # tolist converts to Python numbers in C, str gives their shortest representation
     
     @staticmethod
     def str2list(s: str, type=float) -> list:
@@ -201,7 +199,7 @@ class Simulation:
         """
         s = s.replace("\n", "")
         l = s.split(",")
-        return np.array(l).astype(type) if s != "" else np.array([])
+        return np.array(l).astype(type) if s != "" else np.array([], dtype=type) # an empty line (no particles) keeps the type, so it can still be used as indices
 
 #################################################################
 
@@ -209,42 +207,42 @@ class RestString(Simulation):
     """
         Abstraction of Simulation: the initial field is at rest
     """
-    def __init__(self, dt: float, time_steps: int, space_steps: int, string_len: float, string_density: float, string_tension: float, edge_left: Edge, edge_right: Edge, particles, log=True, memory_field=5):
-        ic0 = [0.0]*space_steps
-        ic1 = ic0.copy()
-        super().__init__(dt, time_steps,  space_steps, string_len, string_density, string_tension, edge_left, edge_right, ic0, ic1, particles, log=log, memory_field=memory_field)
+    def __init__(self, dt: float, time_steps: int, space_steps: int, string_len: float, string_density: float, string_tension: float, edge_left: Edge, edge_right: Edge, particles, log=True, memory_field=3, jit=True, dtype=np.float64):
+        ic0 = np.zeros(space_steps)
+        ic1 = np.zeros(space_steps)
+        super().__init__(dt, time_steps,  space_steps, string_len, string_density, string_tension, edge_left, edge_right, ic0, ic1, particles, log=log, memory_field=memory_field, jit=jit, dtype=dtype)
 
 class FreeString(RestString):
     """
         Abstraction of RestString: the system is particle free
     """
-    def __init__(self, dt: float, time_steps: int, space_steps: int, string_len: float, string_density: float, string_tension: float, edge_left: Edge, edge_right: Edge, log=True, memory_field=5):
+    def __init__(self, dt: float, time_steps: int, space_steps: int, string_len: float, string_density: float, string_tension: float, edge_left: Edge, edge_right: Edge, log=True, memory_field=3, jit=True, dtype=np.float64):
         particles = Particles(space_steps=space_steps)
-        super().__init__(dt, time_steps, space_steps, string_len, string_density, string_tension, edge_left, edge_right, particles, log=log, memory_field=memory_field)
+        super().__init__(dt, time_steps, space_steps, string_len, string_density, string_tension, edge_left, edge_right, particles, log=log, memory_field=memory_field, jit=jit, dtype=dtype)
 
 class CenterFixed(RestString):
     """
         Abstraction of RestString: the system has a single particle in the center of the string
     """
-    def __init__(self, dt: float, time_steps: int, space_steps: int, string_len: float, string_density: float, string_tension: float, edge_left: Edge, edge_right: Edge, mass_particle: float, pulsation_particle: float, log=True, memory_field=5):
+    def __init__(self, dt: float, time_steps: int, space_steps: int, string_len: float, string_density: float, string_tension: float, edge_left: Edge, edge_right: Edge, mass_particle: float, pulsation_particle: float, log=True, memory_field=3, jit=True, dtype=np.float64):
         center_string = math.floor(space_steps*0.5)
         stiffness = mass_particle*pulsation_particle**2
         p = Particle(center_string, 0.0, mass_particle, stiffness, True, space_steps)
         particles = Particles(p)
-        super().__init__(dt, time_steps, space_steps, string_len, string_density, string_tension, edge_left, edge_right, particles, log=log, memory_field=memory_field)
+        super().__init__(dt, time_steps, space_steps, string_len, string_density, string_tension, edge_left, edge_right, particles, log=log, memory_field=memory_field, jit=jit, dtype=dtype)
 
 class Cavity(Simulation):
     """
         Abstraction of Simulation: mirrors in both ends, initial position given but initial velocity is zero
     """
-    def __init__(self, dt: float, time_steps: int, space_steps: int, string_len: float, string_density: float, string_tension: float, ic0: list[float], ic1: list[float], particles: Particles, log=True, memory_field=5):
+    def __init__(self, dt: float, time_steps: int, space_steps: int, string_len: float, string_density: float, string_tension: float, ic0: list[float], ic1: list[float], particles: Particles, log=True, memory_field=3, jit=True, dtype=np.float64):
         ml, mr = MirrorEdge(), MirrorEdge()
-        super().__init__(dt, time_steps, space_steps, string_len, string_density, string_tension, ml, mr, ic0, ic1, particles, log=log, memory_field=memory_field)
+        super().__init__(dt, time_steps, space_steps, string_len, string_density, string_tension, ml, mr, ic0, ic1, particles, log=log, memory_field=memory_field, jit=jit, dtype=dtype)
 
 class RingString(Simulation):
     """
         Abstraction of Simulation: both ends are connected (equivalent of a ring)
     """
-    def __init__(self, dt: float, time_steps: int, space_steps: int, string_len: float, string_density: float, string_tension: float, ic0: list[float], ic1: list[float], particles: Particles, log=True, memory_field=5):
+    def __init__(self, dt: float, time_steps: int, space_steps: int, string_len: float, string_density: float, string_tension: float, ic0: list[float], ic1: list[float], particles: Particles, log=True, memory_field=3, jit=True, dtype=np.float64):
         ll, lr = LoopEdge(), LoopEdge()
-        super().__init__(dt, time_steps, space_steps, string_len, string_density, string_tension, ll, lr, ic0, ic1, particles, log=log, memory_field=memory_field)
\ No newline at end of file
+        super().__init__(dt, time_steps, space_steps, string_len, string_density, string_tension, ll, lr, ic0, ic1, particles, log=log, memory_field=memory_field, jit=jit, dtype=dtype)
\ No newline at end of file